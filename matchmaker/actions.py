@@ -6,7 +6,7 @@ def convert_action_columns(actions):
     actions['Proceeds'] = pd.to_numeric(actions['Proceeds'], errors='coerce')
     actions['Value'] = pd.to_numeric(actions['Value'], errors='coerce')
     actions['Quantity'] = pd.to_numeric(actions['Quantity'], errors='coerce')
-    actions['Date/Time'] = pd.to_datetime(actions['Date/Time'])
+    actions['Date/Time'] = pd.to_datetime(actions['Date/Time'], format='ISO8601')
     actions['Category'] = 'Actions'
     actions = actions[['Category'] + [col for col in actions.columns if col != 'Category']]
     return actions
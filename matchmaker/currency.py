@@ -17,7 +17,7 @@ def adjust_rates_columns(df):
 
 @st.cache_data()
 def load_yearly_rates(directory):
-    df = pd.read_csv(directory + '/CurrencyRatesYearly.csv')
+    df = pd.read_csv(directory + '/CurrencyRatesYearly.csv', engine='pyarrow', dtype={'Year': 'int64'})
     df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
     df.set_index('Year', inplace=True)
     df = adjust_rates_columns(df)
@@ -28,10 +28,12 @@ def load_yearly_rates(directory):
 def load_daily_rates(directory):
     df = None
     for f in glob.glob(directory + '/CurrencyRatesDaily.*.csv'):
+        # Dates are in Czech format which pyarrow does not recognize, they are parsed below
+        rates = pd.read_csv(f, engine='pyarrow', dtype={'Datum': 'string'})
         if df is None:
-            df = pd.read_csv(f)
+            df = rates
         else:
-            df = pd.concat([df, pd.read_csv(f)], ignore_index = True)
+            df = pd.concat([df, rates], ignore_index = True)
     df['Datum'] = pd.to_datetime(df['Datum'], format='%d.%m.%Y')
     df.set_index('Datum', inplace=True)
     df = adjust_rates_columns(df)
@@ -40,15 +42,44 @@ def load_daily_rates(directory):
 def get_adjusted_price(ticker, date):
     pass
 
+# Rates of every row at once, rows without a rate for their currency and date get NaN
+def lookup_yearly_rates(rates, years, currencies):
+    return _lookup_rates(rates, rates.index.get_indexer(years), currencies)
+
+# Daily rates take the last rate published on or before the day of each row
+def lookup_daily_rates(rates, times, currencies):
+    rates = rates.sort_index()
+    days = times.dt.normalize()
+    rows = rates.index.searchsorted(days.to_numpy(), side='right') - 1
+    rows[days.isna().to_numpy()] = -1
+    return _lookup_rates(rates, rows, currencies)
+
+def _lookup_rates(rates, rows, currencies):
+    if not rates.columns.is_unique:
+        # Currencies quoted per a different amount in other years are in several columns, take the one with a value
+        rates = rates.T.groupby(level=0, sort=False).first().T
+    columns = rates.columns.get_indexer(np.asarray(currencies, dtype=object))
+    found = (rows >= 0) & (columns >= 0)
+    result = np.full(len(rows), np.nan)
+    result[found] = rates.to_numpy(dtype=np.float64)[rows[found], columns[found]]
+    return result
+
+# Converted amounts of trades that are only shown, the profit stays in double precision since it is summed
+FLOAT32_CZK_COLUMNS = ('CZK Proceeds', 'CZK Commission')
+
 @st.cache_data()
 def add_czk_conversion_to_trades(trades, rates, use_yearly_rates=True):
+    # Convert a copy, columns added to the session trades would change the cache key and miss on the next rerun
+    trades = trades.copy()
     if use_yearly_rates:
-        trades['CZK Rate'] = trades.apply(lambda row: rates.loc[row['Date/Time'].year, row['Currency']] if row['Date/Time'].year in rates.index else np.nan, axis=1)
+        trades['CZK Rate'] = lookup_yearly_rates(rates, trades['Date/Time'].dt.year, trades['Currency'])
     else:
-        trades['CZK Rate'] = trades.apply(lambda row: rates.loc[rates.index[rates.index <= pd.to_datetime(row['Date/Time'].date())].max(), row['Currency']], axis=1)
+        trades['CZK Rate'] = lookup_daily_rates(rates, trades['Date/Time'], trades['Currency'])
     trades['CZK Proceeds'] = trades['Proceeds'] *  trades['CZK Rate']
     trades['CZK Commission'] = trades['Comm/Fee'] * trades['CZK Rate']
     trades['CZK Profit'] = trades['Realized P/L'] * trades['CZK Rate']
+    for column in FLOAT32_CZK_COLUMNS:
+        trades[column] = trades[column].astype(np.float32)
     return trades
 
 def add_czk_conversion_to_pairs(trade_pairs, rates, use_yearly_rates=True):
@@ -56,11 +87,11 @@ def add_czk_conversion_to_pairs(trade_pairs, rates, use_yearly_rates=True):
         return trade_pairs
     annotated_pairs = trade_pairs.copy()
     if use_yearly_rates:
-        annotated_pairs['Buy CZK Rate'] = annotated_pairs.apply(lambda row: rates.loc[row['Buy Time'].year, row['Currency']] if row['Buy Time'].year in rates.index else np.nan, axis=1)
-        annotated_pairs['Sell CZK Rate'] = annotated_pairs.apply(lambda row: rates.loc[row['Sell Time'].year, row['Currency']] if row['Sell Time'].year in rates.index else np.nan, axis=1)
+        annotated_pairs['Buy CZK Rate'] = lookup_yearly_rates(rates, annotated_pairs['Buy Time'].dt.year, annotated_pairs['Currency'])
+        annotated_pairs['Sell CZK Rate'] = lookup_yearly_rates(rates, annotated_pairs['Sell Time'].dt.year, annotated_pairs['Currency'])
     else:
-        annotated_pairs['Buy CZK Rate'] = annotated_pairs.apply(lambda row: rates.loc[rates.index[rates.index <= pd.to_datetime(row['Buy Time'].date())].max(), row['Currency']], axis=1)
-        annotated_pairs['Sell CZK Rate'] = annotated_pairs.apply(lambda row: rates.loc[rates.index[rates.index <= pd.to_datetime(row['Sell Time'].date())].max(), row['Currency']], axis=1)
+        annotated_pairs['Buy CZK Rate'] = lookup_daily_rates(rates, annotated_pairs['Buy Time'], annotated_pairs['Currency'])
+        annotated_pairs['Sell CZK Rate'] = lookup_daily_rates(rates, annotated_pairs['Sell Time'], annotated_pairs['Currency'])
     annotated_pairs['CZK Cost'] = annotated_pairs['Cost'] *  annotated_pairs['Buy CZK Rate']
     annotated_pairs['CZK Proceeds'] = annotated_pairs['Proceeds'] *  annotated_pairs['Sell CZK Rate']
     annotated_pairs['CZK Revenue'] = annotated_pairs['CZK Proceeds'] + annotated_pairs['CZK Cost']
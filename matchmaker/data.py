@@ -1,14 +1,39 @@
 # Used to hash entire rows since there is no unique identifier for each row
 from matchmaker import trade
 from matchmaker import position
+from matchmaker import currency
 import json
+import os
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+# Parsed once per process, the modification time in the key picks up edits to the file
+@st.cache_data(show_spinner=False)
+def _load_settings_file(path, mtime):
+    with open(path) as f:
+        return json.load(f)
+
 def load_settings():
     if st.session_state.get('settings') is None:
-        with open('settings.json') as f:
-            st.session_state['settings'] = json.load(f)
+        st.session_state['settings'] = _load_settings_file('settings.json', os.path.getmtime('settings.json'))
+
+# Low-cardinality string columns kept as categoricals so filters and groupbys run on integer codes
+CATEGORICAL_COLUMNS = ('Category', 'Symbol', 'Currency', 'Ticker', 'Display Name', 'Action', 'Type')
+# Prices that are only shown and never enter a tax computation, single precision is enough
+FLOAT32_COLUMNS = ('C. Price', 'MTM P/L')
+
+# Hash frames by content so the cache sees every row, not a sample of a large frame
+# Row hashes ignore column labels and dtypes, so those are part of the key too
+def _hash_dataframe(df):
+    return (tuple(map(str, df.columns)), tuple(map(str, df.dtypes)), pd.util.hash_pandas_object(df, index=True).values.tobytes())
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hash_dataframe})
+def _compute_positions(trades, actions, positions):
+    state = State()
+    state.update(trades=trades, actions=actions, positions=positions)
+    state._compute_all_positions()
+    return state.trades, state.positions, state.symbols
 
 class State:
     def __init__(self):
@@ -19,6 +44,9 @@ class State:
         self.actions = pd.DataFrame()
         self.positions = pd.DataFrame()
         self.symbols = pd.DataFrame
+        self.last_trade_time = None
+        self.year_rows = None
+        self.czk_trades = None
 
     def update(self, **kwargs):
         for key, value in kwargs.items():
@@ -29,58 +57,110 @@ class State:
         self.actions = st.session_state.actions if 'actions' in st.session_state else pd.DataFrame()
         self.positions = st.session_state.positions if 'positions' in st.session_state else pd.DataFrame()
         self.symbols = st.session_state.symbols if 'symbols' in st.session_state else pd.DataFrame()
+        self.last_trade_time = st.session_state.get('last_trade_time')
+        self.year_rows = st.session_state.get('year_rows')
+        self.czk_trades = st.session_state.get('czk_trades')
 
     def save_session(self):
         st.session_state.update(trades=self.trades)
         st.session_state.update(actions=self.actions)
         st.session_state.update(positions=self.positions)
         st.session_state.update(symbols=self.symbols)
+        st.session_state.update(last_trade_time=self.latest_trade_time())
+        st.session_state.update(year_rows=self.rows_by_year())
+        st.session_state.update(czk_trades=self.czk_trades)
 
-    def recompute_positions(self, added_trades = None):
-        if added_trades is not None:
-            updated_tickers = added_trades['Ticker'].unique()
-            new_symbols = pd.DataFrame(added_trades['Symbol'].unique(), columns=['Symbol'])
-            new_symbols.set_index('Symbol', inplace=True)
-            new_symbols['Ticker'] = new_symbols.index
-            self.symbols = pd.concat([self.symbols, new_symbols]).drop_duplicates()
-        else:
-            all_symbols = pd.concat([self.trades['Symbol'], self.positions['Symbol']]).unique()
-            self.symbols = pd.DataFrame(all_symbols, columns=['Symbol'])
-            self.symbols.set_index('Symbol', inplace=True)
-            self.symbols['Ticker'] = self.symbols.index
-            self.symbols['Date'] = pd.NaT
-            added_trades = self.trades
-
-        if len(added_trades) > 0:
-            trade.adjust_for_splits(added_trades, self.actions)
-            # Create a map of symbols that could be renamed (but we don't know for now)
-            self._apply_renames()
-            self.trades = trade.compute_accumulated_positions(self.trades, self.symbols)
-            self.positions['Date/Time'] = pd.to_datetime(self.positions['Date']) + pd.Timedelta(seconds=86399) # Add 23:59:59 to the date
-            self.positions = trade.add_split_data(self.positions, self.actions)
-            
-            self.detect_and_apply_renames()
-            self.trades['Display Name'] = self.trades['Ticker'] + self.trades['Display Suffix'].fillna('')
+    # Forms bound their dates by the latest trade, it is scanned for once per change of the trades instead of per render
+    def latest_trade_time(self):
+        if self.last_trade_time is None and 'Date/Time' in self.trades.columns:
+            self.last_trade_time = self.trades['Date/Time'].max()
+        return self.last_trade_time
+
+    # Row positions of the trades of every year, so filtering a year does not compare the whole column again
+    def rows_by_year(self):
+        if self.year_rows is None and 'Year' in self.trades.columns:
+            self.year_rows = self.trades.groupby('Year', sort=False).indices
+        return self.year_rows
+
+    # Trades converted by daily rates, kept in the session so page reruns do not hash and convert all trades again
+    def trades_in_czk(self, daily_rates):
+        if self.czk_trades is None:
+            self.czk_trades = currency.add_czk_conversion_to_trades(self.trades, daily_rates, use_yearly_rates=False)
+            st.session_state.update(czk_trades=self.czk_trades)
+        return self.czk_trades
+
+    def recompute_positions(self):
+        self.last_trade_time = None
+        self.year_rows = None
+        self.czk_trades = None
+        # A full recompute depends only on the imported tables, so an unchanged state is served from cache
+        self.trades, self.positions, self.symbols = _compute_positions(self.trades, self.actions, self.positions)
+
+    def _compute_all_positions(self):
+        all_symbols = pd.concat([self.trades['Symbol'], self.positions['Symbol']], copy=False, sort=False).astype(object).unique()
+        self.symbols = pd.DataFrame(all_symbols, columns=['Symbol'])
+        self.symbols.set_index('Symbol', inplace=True)
+        self.symbols['Ticker'] = self.symbols.index
+        self.symbols['Date'] = pd.NaT
+        # Single pass over trades instead of masking them once per symbol, joined on the symbol index
+        self.symbols = self.symbols.join(self.trades.groupby('Symbol', sort=False, observed=True)['Currency'].first())
+        if len(self.trades) > 0:
+            # Take the returned frame, a cache hit does not repeat the in-place adjustment
+            self.trades = trade.adjust_for_splits(self.trades, self.actions)
+            self._update_positions()
+
+    def _update_positions(self):
+        # Create a map of symbols that could be renamed (but we don't know for now)
+        self._apply_renames()
+        self.trades = trade.compute_accumulated_positions(self.trades, self.symbols)
+        # Shift the raw datetime64 values without building an intermediate series, NaT stays NaT
+        self.positions['Date/Time'] = self.positions['Date'].to_numpy(dtype='datetime64[ns]') + np.timedelta64(86399, 's') # Add 23:59:59 to the date
+        self.positions = trade.add_split_data(self.positions, self.actions)
+        
+        self.detect_and_apply_renames()
+        self.trades['Display Name'] = self.trades['Ticker'].astype(object) + self.trades['Display Suffix'].fillna('')
+        self.normalize_tables()
+        # Trades are kept in the shown order, so the row positions per year stay valid until the next recompute
+        self.trades.sort_values(by=['Ticker', 'Date/Time'], kind='mergesort', inplace=True)
+
+    # Concatenation with fresh imports falls back to object and 64-bit dtypes, so this runs after every recompute
+    # Runs after the rows are hashed, the narrower types do not change the hashes
+    def normalize_tables(self):
+        for table in (self.trades, self.positions):
+            for column in CATEGORICAL_COLUMNS:
+                if column in table.columns:
+                    table[column] = table[column].astype('category')
+            for column in FLOAT32_COLUMNS:
+                if column in table.columns:
+                    table[column] = table[column].astype(np.float32)
+            if 'Year' in table.columns:
+                # Smallest integer type that holds the years, stays float only if some year is missing
+                table['Year'] = pd.to_numeric(table['Year'], downcast='integer')
 
     def add_manual_trades(self, new_trades):
-        self.trades = pd.concat([self.trades, new_trades])
+        # Renames are guessed from the positions of all tickers, so a new trade can change them anywhere
+        self.trades = pd.concat([self.trades, new_trades], copy=False, sort=False)
         self.recompute_positions()
 
     # Apply ticker renames by consulting the symbol rename table        
     def _apply_renames(self):
-        # Rename the symbols in trades 
+        # Rename the symbols in trades by a hash lookup into the symbol table, keeping the Hash index intact
+        ticker_lookup = self.symbols['Ticker']
         self.trades.drop(columns=['Ticker'], errors='ignore', inplace=True)
-        self.trades = self.trades.reset_index().rename(columns={'index': 'Hash'})
-        self.trades = self.trades.merge(self.symbols[['Ticker']], left_on='Symbol', right_index=True, how='left').set_index('Hash')
+        self.trades['Ticker'] = self.trades['Symbol'].map(ticker_lookup)
+        self.trades.index.name = 'Hash'
         # Rename the symbols in positions
         self.positions.drop(columns=['Ticker'], errors='ignore', inplace=True)
-        self.positions = self.positions.merge(self.symbols[['Ticker']], left_on='Symbol', right_index=True, how='left')
+        self.positions['Ticker'] = self.positions['Symbol'].map(ticker_lookup)
 
     def detect_and_apply_renames(self):
         mismatches, renames = position.check_open_position_mismatches(self.trades, self.positions)
-        for index, row in renames.iterrows():
-            self.symbols.loc[self.symbols.index == row['From'], ['Ticker', 'Date']] = [row['To'], row['Date']] 
         # Now we can adjust the trades for the renames
         if len(renames) > 0:
+            # Index renames by the original symbol once, the last detected rename of a symbol wins
+            renamed = renames.drop_duplicates(subset='From', keep='last').set_index('From')
+            renamed = renamed[renamed.index.isin(self.symbols.index)]
+            self.symbols.loc[renamed.index, 'Ticker'] = renamed['To']
+            self.symbols.loc[renamed.index, 'Date'] = renamed['Date']
             self._apply_renames()
             self.trades = trade.compute_accumulated_positions(self.trades, self.symbols)
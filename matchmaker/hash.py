@@ -1,4 +1,6 @@
 import hashlib
+import numpy as np
+import pandas as pd
 
 def hash_row(row):
     row_str = row.to_string()
@@ -6,3 +8,41 @@ def hash_row(row):
     hash_object.update(row_str.encode())
     hash_hex = hash_object.hexdigest()
     return hash_hex
+
+# Formats a value the way Series.to_string() does in a row of mixed values
+def format_value(value, precision):
+    if value is None:
+        return ' None'
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return ' NaN'
+        text = f'{value: .{precision}f}'.rstrip('0')
+        return text + '0' if text.endswith('.') else text
+    if value is pd.NaT:
+        return ' NaT'
+    if value is pd.NA:
+        return ' <NA>'
+    return ' ' + str(value).replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+# Same hashes as hash_row over every row, but formats column by column instead of building a Series per row
+def hash_rows(df):
+    values = df.to_numpy()
+    if values.dtype != object:
+        # Rows of a purely numeric frame are printed by a different formatter
+        return list(df.apply(hash_row, axis=1))
+    precision = pd.get_option('display.precision')
+    max_width = pd.get_option('display.max_colwidth')
+    labels = [str(column) for column in df.columns]
+    label_width = max(len(label) for label in labels) + 3
+    labels = [label.ljust(label_width) for label in labels]
+    columns = [[format_value(value, precision) for value in values] for values in values.T]
+    hashes = []
+    for row in zip(*columns):
+        width = max(map(len, row))
+        if max_width is not None and width > max_width:
+            # Long values are cut to the column width like in the printed row
+            width = max_width
+            row = [value if len(value) <= width else value[:width - 3] + '...' for value in row]
+        row_str = '\n'.join(label + value.rjust(width) for label, value in zip(labels, row))
+        hashes.append(hashlib.sha256(row_str.encode()).hexdigest())
+    return hashes
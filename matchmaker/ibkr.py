@@ -3,44 +3,58 @@ import re
 import pandas as pd
 import streamlit as st
 import numpy as np
-from io import StringIO
+from collections import defaultdict
+from io import BytesIO
 from matchmaker.trade import normalize_trades
 import matchmaker.actions as actions
 import matchmaker.position as position
 
-def dataframe_from_prefixed_lines(line_dict, prefix):
+# Numbers with thousands separators come in as strings, columns pandas already parsed as numbers are kept as they are
+def _to_numeric(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column
+    return pd.to_numeric(column.astype(str).str.replace(',', '', regex=False), errors='coerce')
+
+def dataframe_from_prefixed_lines(line_dict, prefix, skip_columns=None):
     if prefix not in line_dict:
         return pd.DataFrame()
-    file_data = StringIO(''.join(line_dict[prefix]))
-    return pd.read_csv(file_data)
+    # Sections are kept as raw bytes, the parser reads them without a decode or join
+    file_data = BytesIO(line_dict[prefix])
+    # Columns dropped right after import are not parsed at all
+    usecols = (lambda column: column not in skip_columns) if skip_columns else None
+    return pd.read_csv(file_data, usecols=usecols)
 
-# Parses the CSV into a dictionary of lines with the same prefix
+# Parses the CSV into a dictionary of byte buffers with lines of the same prefix
 def parse_csv_into_prefixed_lines(file):
     file.seek(0)
-    file = [line.decode('utf-8') for line in file]
-    prefix_dict = {}
-    for line in file:
-        key = line.split(',', 1)[0]
-        if key not in prefix_dict:
-            prefix_dict[key] = []
-        prefix_dict[key].append(line)
-    return prefix_dict
+    # Lines break only on newlines as when reading the file line by line, only the prefixes get decoded
+    prefix_buffers = defaultdict(bytearray)
+    for line in BytesIO(file.read()):
+        prefix_buffers[line.partition(b',')[0]] += line
+    return {prefix.decode('utf-8'): buffer for prefix, buffer in prefix_buffers.items()}
 
 def convert_option_names(df):
     if 'Option Name' not in df.columns:
         return df
-    # Vectorized parsing of option names
-    option_mask = df['Option Name'].notna() 
-    option_parts = df.loc[option_mask, 'Symbol'].str.split(' ', expand=True)
-    if not option_parts.empty:
-        # Splits the option name into symbol, expiration date, strike price and put/call
-        # Example option name: CELH 20SEP24 40 P
-        df.loc[option_mask, 'Option Name'] = df.loc[option_mask, 'Symbol']
-        df.loc[option_mask, 'Expiration'] = option_parts[1]
-        df.loc[option_mask, 'Strike'] = option_parts[2]
-        df.loc[option_mask, 'Option Type'] = option_parts[3].map({'P': 'Put', 'C': 'Call'})
-        df.loc[option_mask, 'Display Suffix'] = ' ' + option_parts[1] + ' ' + option_parts[2] + ' ' + df.loc[option_mask, 'Option Type']
-        df.loc[option_mask, 'Symbol'] = option_parts[0]
+    # Vectorized parsing of option names, statements with stocks only skip all string work
+    option_mask = df['Option Name'].notna()
+    if not option_mask.any():
+        return df
+    option_names = df.loc[option_mask, 'Symbol']
+    # Splits the option name into symbol, expiration date, strike price and put/call
+    # Example option name: CELH 20SEP24 40 P
+    option_parts = option_names.str.split(' ', n=3, expand=True)
+    option_type = option_parts[3].map({'P': 'Put', 'C': 'Call'})
+    # Write all parsed columns with a single indexer
+    parsed = pd.DataFrame({
+        'Option Name': option_names,
+        'Expiration': option_parts[1],
+        'Strike': option_parts[2],
+        'Option Type': option_type,
+        'Display Suffix': ' ' + option_parts[1].str.cat([option_parts[2], option_type], sep=' '),
+        'Symbol': option_parts[0],
+    })
+    df.loc[option_mask, parsed.columns] = parsed
     return df
     
 # Import trades from IBKR format
@@ -60,101 +74,94 @@ def convert_option_names(df):
 
 # Data begins on the second line
 # Example line: Trades,Data,Order,Stocks,CZK,CEZ,"2023-08-03, 08:44:03",250,954,960,-238500,-763.2,239263.2,0,1500,O
+# Empty sections are built once, every import filters them into a new frame before changing anything
+EMPTY_TRADES = pd.DataFrame(columns=['Trades', 'Header', 'DataDiscriminator', 'Asset Category', 'Currency', 'Symbol', 'Date/Time', 'Quantity', 'T. Price', 'C. Price', 'Proceeds', 'Comm/Fee', 'Basis', 'Realized P/L', 'MTM P/L', 'Code'])
+
 def import_trades(file):
     df = dataframe_from_prefixed_lines(file, 'Trades')
     if df.empty:
-        df = pd.DataFrame(columns=['Trades', 'Header', 'DataDiscriminator', 'Asset Category', 'Currency', 'Symbol', 'Date/Time', 'Quantity', 'T. Price', 'C. Price', 'Proceeds', 'Comm/Fee', 'Basis', 'Realized P/L', 'MTM P/L', 'Code'])
-    df = df[(df['Trades'] == 'Trades') & (df['Header'] == 'Data') & (df['DataDiscriminator'] == 'Order') & ((df['Asset Category'] == 'Stocks') | (df['Asset Category'] == 'Equity and Index Options'))]
+        df = EMPTY_TRADES
+    df = df[(df['Trades'] == 'Trades') & (df['Header'] == 'Data') & (df['DataDiscriminator'] == 'Order') & df['Asset Category'].isin(['Stocks', 'Equity and Index Options'])]
     df['Date/Time'] = pd.to_datetime(df['Date/Time'], format='%Y-%m-%d, %H:%M:%S')
-    df['Quantity'] = pd.to_numeric(df['Quantity'].astype(str).str.replace(',', ''), errors='coerce')
+    df['Quantity'] = _to_numeric(df['Quantity'])
     df['Option Name'] = df[df['Asset Category'] == 'Equity and Index Options']['Symbol']
     df['Display Suffix'] = ''
     df = convert_option_names(df)
     df.drop(columns=['Trades', 'Header', 'DataDiscriminator', 'Asset Category',], inplace=True)
     return normalize_trades(df)
 
+# Corporate action descriptions fused into one pattern, alternatives are tried in this order and only the matching one fills its groups
+ACTION_PATTERN = re.compile('^(?:' + '|'.join([
+    # Split anywhere in the text: AAPL(US0378331005) Split 4 for 1
+    r'(?s:.*?)(?P<split>[\w\.]+)\(\w+\) Split (?P<split_new>\d+) for (?P<split_old>\d+)',
+    r'(?P<spinoff>\w+)\(\w+\) Spinoff\s+(?P<spinoff_new>\d+) for (?P<spinoff_old>\d+) \((?P<spinoff_symbol>\w+),.+\)',
+    # Stock bought by another: ATVI(US00507V1098) Merged(Acquisition) FOR USD 95.00 PER SHARE
+    r'(?P<cash>\w+)\(\w+\) Merged\(Acquisition\) FOR (?P<cash_currency>\w+) (?P<cash_price>\d+\.\d+) PER SHARE',
+    # Converted to other stock: MRO(US5658491064) Merged(Acquisition) WITH US20825C1045 255 for 1000 (COP, CONOCOPHILLIPS, US20825C1045)
+    r'(?P<stock>\w+)\(\w+\) Merged\(Acquisition\) WITH (?P<stock_target>\w+) (?P<stock_new>\d+) for (?P<stock_old>\d+) \((?P<stock_symbol>\w+),',
+    r'(?P<unknown>\w+)\(\w+\)',
+    r'(?s:.*?)(?-i:(?P<dividend>Dividend))',
+]) + ')', re.IGNORECASE)
+
+# Parse action, symbol, ratio and target out of all descriptions in a single vectorized pass
+def parse_action_texts(descriptions):
+    parts = descriptions.str.extract(ACTION_PATTERN)
+    matches = [parts[group].notna() for group in ['split', 'spinoff', 'cash', 'stock', 'unknown', 'dividend']]
+    def pick(values, default, dtype=object):
+        return np.select(matches, [np.asarray(value, dtype=dtype) for value in values], default=default)
+    return pd.DataFrame({
+        'Action': pick(['Split', 'Spinoff', 'Acquisition', 'Acquisition', 'Unknown', 'Dividend'], 'Unknown'),
+        'Symbol': pick([parts['split'], parts['spinoff_symbol'], parts['cash'], parts['stock_symbol'], parts['unknown'], None], None),
+        'Ratio': pick([parts['split_old'].astype(float) / parts['split_new'].astype(float), parts['spinoff_new'].astype(float) / parts['spinoff_old'].astype(float), 
+                       parts['cash_price'].astype(float), parts['stock_old'].astype(float) / parts['stock_new'].astype(float), 0.0, np.nan], np.nan, float),
+        'Target': pick([None, None, None, parts['stock'], None, None], None),
+    }, index=descriptions.index)
+
+EMPTY_CORPORATE_ACTIONS = pd.DataFrame(columns=['Corporate Actions', 'Header', 'Asset Category', 'Currency', 'Report Date', 'Date/Time', 'Description', 'Quantity', 'Proceeds', 'Value', 'Realized P/L', 'Action', 'Symbol', 'Ratio', 'Code', 'Target'])
+
 def import_corporate_actions(file):
     df = dataframe_from_prefixed_lines(file, 'Corporate Actions')
     if df.empty:
-        df = pd.DataFrame(columns=['Corporate Actions', 'Header', 'Asset Category', 'Currency', 'Report Date', 'Date/Time', 'Description', 'Quantity', 'Proceeds', 'Value', 'Realized P/L', 'Action', 'Symbol', 'Ratio', 'Code', 'Target'])
+        df = EMPTY_CORPORATE_ACTIONS
     df = df[df['Asset Category'] == 'Stocks']
     df.drop(columns=['Corporate Actions', 'Header', 'Asset Category'], inplace=True)
     
-    def parse_action_text(text):
-        action, symbol, ratio, target = parse_split_text(text)
-        if not action:
-            action, symbol, ratio, target = parse_spinoff_text(text)
-        if not action:
-            action, symbol, ratio, target = parse_acquisition_text(text)
-        if not action:
-            match = re.search(r'^(\w+)\(\w+\)', text)
-            if match:
-                action, symbol, ratio, target = 'Unknown', match.group(1), 0.0, None
-        if not action and 'Dividend' in text:
-            action, symbol, ratio, target = 'Dividend', None, None, None
-        if not action:
-            action, symbol, ratio, target = 'Unknown', None, None, None
-        return action, symbol, ratio, target
-    
-    def parse_split_text(text):
-        match = re.search(r'([\w\.]+)\(\w+\) Split (\d+) for (\d+)', text, re.IGNORECASE)
-        if match:
-            ratio = float(match.group(3)) / float(match.group(2))
-            return 'Split', match.group(1), ratio, None
-        return None, None, None, None
-    
-    def parse_spinoff_text(text):
-        match = re.search(r'^(\w+)\(\w+\) Spinoff\s+(\d+) for (\d+) \((\w+),.+\)', text, re.IGNORECASE)
-        if match:
-            ratio = float(match.group(2)) / float(match.group(3))
-            return 'Spinoff', match.group(4), ratio, None
-        return None, None, None, None
-    
-    def parse_acquisition_text(text):
-        # Stock bought by another: ATVI(US00507V1098) Merged(Acquisition) FOR USD 95.00 PER SHARE
-        match = re.search(r'^(\w+)\(\w+\) Merged\(Acquisition\) FOR (\w+) (\d+\.\d+) PER SHARE', text, re.IGNORECASE)
-        if match:
-            ratio = float(match.group(3))
-            return 'Acquisition', match.group(1), ratio, None
-        # Converted to other stock: MRO(US5658491064) Merged(Acquisition) WITH US20825C1045 255 for 1000 (COP, CONOCOPHILLIPS, US20825C1045)
-        match = re.search(r'^(\w+)\(\w+\) Merged\(Acquisition\) WITH (\w+) (\d+) for (\d+) \((\w+),', text, re.IGNORECASE)
-        if match:
-            ratio = float(match.group(4)) / float(match.group(3))
-            return 'Acquisition', match.group(5), ratio, match.group(1)
-        return None, None, None, None
-    
-    df['Quantity'] = pd.to_numeric(df['Quantity'].astype(str).str.replace(',', ''), errors='coerce')
+    df['Quantity'] = _to_numeric(df['Quantity'])
     df['Date/Time'] = pd.to_datetime(df['Date/Time'], format='%Y-%m-%d, %H:%M:%S')
     if not df.empty:
-        df[['Action', 'Symbol', 'Ratio', 'Target']] = df['Description'].apply(lambda x: pd.Series(parse_action_text(x)))
+        df[['Action', 'Symbol', 'Ratio', 'Target']] = parse_action_texts(df['Description'])
     df.drop(columns=['Code'], inplace=True)
     df = actions.convert_action_columns(df)
     return df
 
+# Mark-to-Market Performance Summary,Header,Asset Category,Symbol,Prior Quantity,Current Quantity,Prior Price,
+# Current Price,Mark-to-Market P/L Position,Mark-to-Market P/L Transaction,Mark-to-Market P/L Commissions,Mark-to-Market P/L Other,Mark-to-Market P/L Total,Code
+EMPTY_OPEN_POSITIONS = pd.DataFrame(columns=['Mark-to-Market Performance Summary', 'Header', 'Asset Category', 'Symbol', 'Prior Quantity', 'Current Quantity', 'Prior Price', 'Current Price',
+                                             'Mark-to-Market P/L Position','Mark-to-Market P/L Transaction','Mark-to-Market P/L Commissions','Mark-to-Market P/L Other','Mark-to-Market P/L Total','Code'])
+
 def import_open_positions(file, date_from, date_to):
     # Old format that doesn't reflect symbol changes
-    df = dataframe_from_prefixed_lines(file, 'Mark-to-Market Performance Summary')
+    df = dataframe_from_prefixed_lines(file, 'Mark-to-Market Performance Summary', skip_columns=['Code'])
     if df.empty:
-        # Mark-to-Market Performance Summary,Header,Asset Category,Symbol,Prior Quantity,Current Quantity,Prior Price,
-        # Current Price,Mark-to-Market P/L Position,Mark-to-Market P/L Transaction,Mark-to-Market P/L Commissions,Mark-to-Market P/L Other,Mark-to-Market P/L Total,Code
-        df = pd.DataFrame(columns=['Mark-to-Market Performance Summary', 'Header', 'Asset Category', 'Symbol', 'Prior Quantity', 'Current Quantity', 'Prior Price', 'Current Price',
-                                'Mark-to-Market P/L Position','Mark-to-Market P/L Transaction','Mark-to-Market P/L Commissions','Mark-to-Market P/L Other','Mark-to-Market P/L Total','Code'])
+        df = EMPTY_OPEN_POSITIONS
     df = df[df['Asset Category'] == 'Stocks']
-    df.drop(columns=['Mark-to-Market Performance Summary', 'Header', 'Asset Category', 'Code'], inplace=True)
+    df.drop(columns=['Mark-to-Market Performance Summary', 'Header', 'Asset Category', 'Code'], errors='ignore', inplace=True)
     df['Prior Date'] = date_from
     df['Current Date'] = date_to
     return position.convert_position_history_columns(df)
 
+# Transfers,Header,Asset Category,,Currency,Symbol,Date,Type,Direction,Xfer Company,Xfer Account,Qty,Xfer Price,Market Value,Realized P/L,Cash Amount,Code
+EMPTY_TRANSFERS = pd.DataFrame(columns=['Transfers', 'Header', 'Asset Category', 'Currency', 'Symbol', 'Date', 'Type', 'Direction', 'Xfer Company', 'Xfer Account', 'Qty', 'Xfer Price', 'Market Value', 'Realized P/L', 'Cash Amount', 'Code'])
+
 def import_transfers(file):
-    df = dataframe_from_prefixed_lines(file, 'Transfers')
+    df = dataframe_from_prefixed_lines(file, 'Transfers', skip_columns=['Type', 'Direction', 'Xfer Company', 'Xfer Price', 'Cash Amount', 'Code'])
     if df.empty:
-        # Transfers,Header,Asset Category,,Currency,Symbol,Date,Type,Direction,Xfer Company,Xfer Account,Qty,Xfer Price,Market Value,Realized P/L,Cash Amount,Code
-        df = pd.DataFrame(columns=['Transfers', 'Header', 'Asset Category', 'Currency', 'Symbol', 'Date', 'Type', 'Direction', 'Xfer Company', 'Xfer Account', 'Qty', 'Xfer Price', 'Market Value', 'Realized P/L', 'Cash Amount', 'Code'])
+        df = EMPTY_TRANSFERS
     df = df[df['Asset Category'] == 'Stocks']
     df['Date/Time'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
     df['Action'] = 'Transfer'
-    df['Quantity'] = pd.to_numeric(df['Qty'].astype(str).str.replace(',', ''), errors='coerce')
-    df['Proceeds'] = pd.to_numeric(df['Market Value'].astype(str).str.replace(',', ''), errors='coerce')
+    df['Quantity'] = _to_numeric(df['Qty'])
+    df['Proceeds'] = _to_numeric(df['Market Value'])
     df['Comm/Fee'] = 0
     df['Basis'] = 0
     df['Realized P/L'] = 0
@@ -162,43 +169,52 @@ def import_transfers(file):
     df['T. Price'] = 0
     df['C. Price'] = 0
     df['Target'] = df['Xfer Account']
-    df.drop(columns=['Transfers', 'Header', 'Asset Category', 'Date', 'Type', 'Direction', 'Xfer Company', 'Xfer Account', 'Qty', 'Xfer Price', 'Market Value', 'Cash Amount', 'Code'], inplace=True)
+    df.drop(columns=['Transfers', 'Header', 'Asset Category', 'Date', 'Type', 'Direction', 'Xfer Company', 'Xfer Account', 'Qty', 'Xfer Price', 'Market Value', 'Cash Amount', 'Code'], errors='ignore', inplace=True)
     return normalize_trades(df)
 
 def generate_transfers_from_actions(actions):
     spinoffs = actions[(actions['Action'] == 'Spinoff') | (actions['Action'] == 'Acquisition')]
-    transfers = pd.DataFrame()
-    for index, spinoff in spinoffs.iterrows():
-        transfer = {
-            'Date/Time': spinoff['Date/Time'] - pd.Timedelta(seconds=1),
-            'Currency': spinoff['Currency'],
-            'Symbol': spinoff['Symbol'],
-            'Quantity': spinoff['Quantity'],
-            'Proceeds': spinoff['Proceeds'],
-            'Comm/Fee': 0,
-            'Basis': 0,
-            'Realized P/L': spinoff['Realized P/L'],
-            'MTM P/L': 0,
-            'T. Price': spinoff['Proceeds'] / abs(spinoff['Quantity'])  if spinoff['Quantity'] != 0 else 0,
-            'C. Price': 0,
-            'Action': 'Transfer',
-            'Type': spinoff['Action'],
-        }
-        transfers = pd.concat([transfers, pd.DataFrame([transfer])], ignore_index=True)
+    if spinoffs.empty:
+        return normalize_trades(pd.DataFrame())
+    quantity = spinoffs['Quantity'].to_numpy()
+    proceeds = spinoffs['Proceeds'].to_numpy()
+    # Build all transfers in one frame, columns in the same order as before so the row hashes stay the same
+    transfers = pd.DataFrame({
+        'Date/Time': (spinoffs['Date/Time'] - pd.Timedelta(seconds=1)).to_numpy(),
+        'Currency': spinoffs['Currency'].to_numpy(),
+        'Symbol': spinoffs['Symbol'].to_numpy(),
+        'Quantity': quantity,
+        'Proceeds': proceeds,
+        'Comm/Fee': 0,
+        'Basis': 0,
+        'Realized P/L': spinoffs['Realized P/L'].to_numpy(),
+        'MTM P/L': 0,
+        'T. Price': np.divide(proceeds, np.abs(quantity), out=np.zeros(len(spinoffs)), where=quantity != 0),
+        'C. Price': 0,
+        'Action': 'Transfer',
+        'Type': spinoffs['Action'].to_numpy(),
+    })
     return normalize_trades(transfers)
 
+# 3rd line of a statement: Statement,Data,Period,"April 13, 2020 - April 12, 2021"
+PERIOD_PATTERN = re.compile(r'Statement,Data,Period,"(.+) - (.+)"')
+ACCOUNT_PATTERN = re.compile(r'U\d+')
+# Statement exports named U12345678_[optional_]20230101_20231231.csv
+STATEMENT_FILE_PATTERN = re.compile(r'.+U(\d+)_(\d{8})_(\d{8})')
+
 # @st.cache_data()
 def import_activity_statement(file):
-    file.seek(0)
+    lines = parse_csv_into_prefixed_lines(file)
     # 2nd line: Statement,Data,Title,Activity Statement
     # 3rd line: Statement,Data,Period,"April 13, 2020 - April 12, 2021"
-    while line := file.readline().decode('utf-8'):
+    # Both are in the short Statement section, so only that gets decoded and scanned
+    header = iter(lines.get('Statement', b'').decode('utf-8').splitlines())
+    for line in header:
         if line.startswith('Statement,Data,Title,Activity '):
             break
-    match_period = re.match('Statement,Data,Period,"(.+) - (.+)"', file.readline().decode('utf-8'))
+    match_period = PERIOD_PATTERN.match(next(header, ''))
     if not match_period:
         raise Exception('No period in IBKR Activity Statement')
-    lines = parse_csv_into_prefixed_lines(file)
 
     # Convert to from and to dates
     from_date = pd.to_datetime(match_period.group(1), format='%B %d, %Y')
@@ -211,8 +227,8 @@ def import_activity_statement(file):
     trades = pd.concat([trades, transfers])
     # Fill in account info into trades so open positions can be computed and verified per account
     account_info = dataframe_from_prefixed_lines(lines, 'Account Information')
-    account = account_info[account_info['Field Name'] == 'Account'].iloc[0]['Field Value']
-    account = re.match(r'U\d+', account).group(0)
+    account = account_info.loc[account_info['Field Name'] == 'Account', 'Field Value'].iat[0]
+    account = ACCOUNT_PATTERN.match(account).group(0)
     if 'Account' not in trades.columns:
         trades['Account'] = account
     trades['Account'].fillna(account, inplace=True)
@@ -225,7 +241,7 @@ def import_all_statements(directory, tickers_dir=None):
     data = None
     for f in glob.glob(directory + '/U*_*_*.csv'):
         # Only if matching U12345678_[optional_]20230101_20231231.csv
-        if(re.match(r'.+U(\d+)_(\d{8})_(\d{8})', f)):
+        if(STATEMENT_FILE_PATTERN.match(f)):
             # Read the file 
             with open(f, 'r') as file:
                 data = import_activity_statement(file, data, tickers_dir)
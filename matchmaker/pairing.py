@@ -7,8 +7,8 @@ strategies = ['FIFO', 'LIFO', 'AverageCost', 'MaxLoss', 'MaxProfit']
 def load_buy_sell_pairs(filename):
     pairs = pd.read_csv(filename)
     # Convert columns to correct types
-    pairs['Buy Time'] = pd.to_datetime(pairs['Buy Time'])
-    pairs['Sell Time'] = pd.to_datetime(pairs['Sell Time'])
+    pairs['Buy Time'] = pd.to_datetime(pairs['Buy Time'], format='ISO8601')
+    pairs['Sell Time'] = pd.to_datetime(pairs['Sell Time'], format='ISO8601')
     pairs['Quantity'] = pd.to_numeric(pairs['Quantity'], errors='coerce')
     pairs['Buy Price'] = pd.to_numeric(pairs['Buy Price'], errors='coerce')
     pairs['Sell Price'] = pd.to_numeric(pairs['Sell Price'], errors='coerce')
@@ -46,7 +46,7 @@ def pair_buy_sell(trades, pairs, strategy, from_year=None):
     
     trades = fill_trades_covered_quantity(trades, pairs)
     # trades.round(3).to_csv('paired.order.quantities.csv')
-    per_symbol = trades.groupby('Display Name')
+    per_symbol = trades.groupby('Display Name', observed=True)
     if pairs is None:
         pairs = pd.DataFrame(columns=['Buy Transaction', 'Sell Transaction', 'Display Name', 'Quantity', 'Buy Time', 'Buy Price', 'Sell Time', 'Sell Price', 'Buy Cost', 'Sell Proceeds', 'Revenue', 'Ratio', 'Type', 'Taxable'])
     for symbol, group in per_symbol:
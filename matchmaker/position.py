@@ -2,8 +2,8 @@
 import pandas as pd
 
 def convert_position_history_columns(df):
-    df['Prior Date'] = pd.to_datetime(df['Prior Date'])
-    df['Date'] = pd.to_datetime(df['Current Date'])
+    df['Prior Date'] = pd.to_datetime(df['Prior Date'], format='ISO8601')
+    df['Date'] = pd.to_datetime(df['Current Date'], format='ISO8601')
     df['Prior Quantity'] = pd.to_numeric(df['Prior Quantity'], errors='coerce')
     df['Quantity'] = pd.to_numeric(df['Current Quantity'], errors='coerce')
     df['Prior Price'] = pd.to_numeric(df['Prior Price'], errors='coerce')
@@ -20,7 +20,7 @@ def convert_position_history_columns(df):
 # Compute open positions per symbol at a given time
 def compute_open_positions(trades, time=pd.Timestamp.now()):
     trades = trades[trades['Date/Time'] <= time]
-    positions = trades.groupby('Ticker')[['Accumulated Quantity', 'Date/Time', 'Split Ratio']].last().reset_index()
+    positions = trades.groupby('Ticker', observed=True)[['Accumulated Quantity', 'Date/Time', 'Split Ratio']].last().reset_index()
     return positions[positions['Accumulated Quantity'] != 0]
 
 # Compute open positions per symbol at a given time
@@ -28,7 +28,7 @@ def compute_open_positions_per_account(trades, time=pd.Timestamp.now(), account=
     trades = trades[trades['Date/Time'] <= time]
     if account is not None:
         trades = trades[trades['Account'] == account]
-    positions = trades.groupby('Ticker')[['Account', 'Account Accumulated Quantity', 'Date/Time', 'Split Ratio']].last().reset_index()
+    positions = trades.groupby('Ticker', sort=False, observed=True)[['Account', 'Account Accumulated Quantity', 'Date/Time', 'Split Ratio']].last().reset_index()
     return positions[positions['Account Accumulated Quantity'] != 0]
 
 
@@ -58,7 +58,7 @@ def check_open_position_mismatches(trades, positions, max_date=pd.Timestamp.now(
     agg_funcs = {
         'Date/Time': ['min', 'max']
     }
-    symbol_dates = trades.groupby('Ticker').agg(agg_funcs).reset_index()
+    symbol_dates = trades.groupby('Ticker', sort=False, observed=True).agg(agg_funcs).reset_index()
     symbol_dates.columns = ['Ticker', 'First Activity', 'Last Activity']
     # Group by possibly renamed symbols and check if we have pairs of mismatches
     mismatches = mismatches.merge(symbol_dates, on='Ticker', how='left')
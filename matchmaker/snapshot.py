@@ -1,26 +1,49 @@
-from io import StringIO
+from io import BytesIO, StringIO
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import streamlit as st
 import matchmaker.trade as trade
 import matchmaker.actions as action
 import matchmaker.position as position
 
+SNAPSHOT_HEADER = b'Matchmaker snapshot\n'
+
+# Only the header bytes are read, statements can start with a long line that is not worth decoding
 def is_snapshot(file):
-    header = file.readline()
-    header = header.decode('utf-8')
+    header = file.read(len(SNAPSHOT_HEADER))
     file.seek(0)
-    return header == 'Matchmaker snapshot\n'
+    return header == SNAPSHOT_HEADER
+
+# Writes a table as CSV straight into the byte buffer using the native pyarrow writer
+def write_csv_section(buffer, df, index):
+    if len(df.columns) == 0:
+        buffer.write(b'\n')
+        return
+    pa_csv.write_csv(pa.Table.from_pandas(_stringify_mixed_columns(df), preserve_index=index), buffer)
+
+# Arrow needs one type per column, so values of mixed object columns are written as text like to_csv did
+def _stringify_mixed_columns(df):
+    mixed = [column for column in df.columns if df[column].dtype == object
+             and pd.api.types.infer_dtype(df[column], skipna=True) in ('mixed', 'mixed-integer')]
+    if not mixed:
+        return df
+    df = df.copy(deep=False)
+    for column in mixed:
+        df[column] = df[column].map(lambda value: value if pd.isna(value) else str(value))
+    return df
 
 @st.cache_data()
 def save_snapshot(trades, actions, positions):
-    serialized =  'Matchmaker snapshot\n'
-    serialized += 'Section: Trades\n'
-    serialized += trades.to_csv()
-    serialized += 'Section: Actions\n'
-    serialized += actions.to_csv(index=False)
-    serialized += 'Section: Position History\n'
-    serialized += positions.to_csv(index=False)
-    return serialized
+    buffer = BytesIO()
+    buffer.write(SNAPSHOT_HEADER)
+    buffer.write(b'Section: Trades\n')
+    write_csv_section(buffer, trades, index=True)
+    buffer.write(b'Section: Actions\n')
+    write_csv_section(buffer, actions, index=False)
+    buffer.write(b'Section: Position History\n')
+    write_csv_section(buffer, positions, index=False)
+    return buffer.getvalue()
 
 @st.cache_data()
 def load_snapshot(file):
@@ -5,7 +5,8 @@ from matchmaker import hash
 
 # Ensure all columns are in non-string format
 def convert_trade_columns(df):
-    df['Date/Time'] = pd.to_datetime(df['Date/Time'])
+    # Imports are already parsed and snapshots store ISO timestamps, a fixed format skips inferring it
+    df['Date/Time'] = pd.to_datetime(df['Date/Time'], format='ISO8601')
     df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
     df['Proceeds'] = pd.to_numeric(df['Proceeds'], errors='coerce').astype(np.float64)
     df['Comm/Fee'] = pd.to_numeric(df['Comm/Fee'], errors='coerce').astype(np.float64)
@@ -18,19 +19,17 @@ def convert_trade_columns(df):
         df['Display Suffix'] = ''
     df['Display Suffix'] = df['Display Suffix'].fillna('').astype(str)
     if 'Action' not in df.columns and 'Code' in df.columns:
-       df['Action'] = df['Code'].apply(lambda x: 'Open' if ('O' in x or 'Ca' in x) else 'Close' if 'C' in x else 'Unknown')
+        opening = df['Code'].str.contains('O|Ca', na=False)
+        closing = df['Code'].str.contains('C', regex=False, na=False)
+        df['Action'] = np.where(opening, 'Open', np.where(closing, 'Close', 'Unknown'))
     # If action is not Transfer, then Type is Long if we're opening a position, Short if closing
-    def get_type(row):
-        if row['Quantity'] == 0:
-            return None
-        if row['Action'] == 'Transfer':
-            return 'In' if row['Quantity'] > 0 else 'Out'
-        if (row['Action'] == 'Close' and row['Quantity'] < 0) or (row['Action'] == 'Open' and row['Quantity'] > 0):
-            return 'Long'
-        return 'Short'
+    quantity = df['Quantity'].to_numpy()
+    transfer = (df['Action'] == 'Transfer').to_numpy()
+    long = (((df['Action'] == 'Close') & (df['Quantity'] < 0)) | ((df['Action'] == 'Open') & (df['Quantity'] > 0))).to_numpy()
+    types = np.select([quantity == 0, transfer & (quantity > 0), transfer, long], [None, 'In', 'Out', 'Long'], default='Short')
     if 'Type' not in df.columns:
         df['Type'] = None
-    df['Type'] = df['Type'].fillna(df.apply(get_type, axis=1))
+    df['Type'] = df['Type'].fillna(pd.Series(types, index=df.index))
     return df
 
 # Process trades from raw DataFrame
@@ -44,7 +43,7 @@ def normalize_trades(df):
     df['Category'] = 'Trades'
     df = df[['Category'] + [col for col in df.columns if col != 'Category']]
     # Set up the hash column as index
-    df['Hash'] = df.apply(hash.hash_row, axis=1)
+    df['Hash'] = hash.hash_rows(df)
     df.set_index('Hash', inplace=True)
     # st.write('Imported', len(df), 'rows')
     return df
@@ -56,8 +55,11 @@ def merge_trades(existing, new):
         return new
     if len(new) == 0:
         return existing
-    merged = pd.concat([existing, new])
-    return merged[~merged.index.duplicated(keep='first')]
+    # Existing trades are already unique, append only new rows seen for the first time instead of deduplicating the whole union
+    added = new[~new.index.duplicated(keep='first') & ~new.index.isin(existing.index)]
+    if len(added) == 0:
+        return existing
+    return pd.concat([existing, added], copy=False, sort=False)
 
 # Add split data column to trades by consulting split actions
 def add_split_data(target, split_actions):
@@ -69,27 +71,46 @@ def add_split_data(target, split_actions):
         # Enhance trades with Split Ratio column by looking up same symbol in split_actions
         #  and summing all ratio columns that have a date sooner than the row in trades    
         split_actions = split_actions.sort_values(by='Date/Time', ascending=True)
-        split_actions['Cumulative Ratio'] = split_actions.groupby('Symbol')['Ratio'].cumprod()
-        target['Split Ratio'] = 1 / target.apply(lambda row: split_actions[(split_actions['Symbol'] == row['Symbol']) & (split_actions['Date/Time'] > row['Date/Time'])]['Cumulative Ratio'].min(), axis=1)
-        target['Split Ratio'].fillna(1.0, inplace=True)
-        split_actions.drop(columns=['Cumulative Ratio'], inplace=True)
+        cumulative_ratio = split_actions.groupby('Symbol', sort=False, observed=True)['Ratio'].cumprod()
+        # Minimum over a split and all later splits of the same symbol, so the first later split carries the answer
+        later_ratio = cumulative_ratio[::-1].groupby(split_actions['Symbol'][::-1], sort=False, observed=True).cummin().to_numpy()[::-1]
+        splits = pd.DataFrame({'Symbol': split_actions['Symbol'].astype(object).to_numpy(), 'Date/Time': split_actions['Date/Time'].to_numpy(dtype='datetime64[ns]'), 
+                               'Later Ratio': later_ratio})
+        rows = pd.DataFrame({'Symbol': target['Symbol'].astype(object).to_numpy(), 'Date/Time': target['Date/Time'].to_numpy(dtype='datetime64[ns]'), 
+                             'Row': np.arange(len(target))})
+        rows = rows[rows['Date/Time'].notna()].sort_values(by='Date/Time', kind='mergesort')
+        # Join every row to the first split of its symbol strictly after it
+        matched = pd.merge_asof(rows, splits, on='Date/Time', by='Symbol', direction='forward', allow_exact_matches=False)
+        split_ratio = np.ones(len(target))
+        split_ratio[matched['Row'].to_numpy()] = 1 / matched['Later Ratio'].fillna(1.0).to_numpy()
+        target['Split Ratio'] = split_ratio
     return target
 
 # Compute accumulated positions for each symbol by simulating all trades
 @st.cache_data()
 def compute_accumulated_positions(trades, symbols):
-    trades.sort_values(by=['Date/Time'], inplace=True)
-    trades['Accumulated Quantity'] = trades.groupby(['Ticker', 'Display Suffix'])['Quantity'].cumsum().astype(np.float64)
+    # Group key first keeps every ticker contiguous for the cumulative sums, the stable sort keeps same-time trades in order
+    trades.sort_values(by=['Ticker', 'Date/Time'], kind='mergesort', inplace=True)
+    trades['Accumulated Quantity'] = trades.groupby(['Ticker', 'Display Suffix'], sort=False, observed=True)['Quantity'].cumsum().astype(np.float64, copy=False)
     # Now also compute accumulated quantity per account'
-    trades['Account Accumulated Quantity'] = trades.groupby(['Account', 'Ticker', 'Display Suffix'])['Quantity'].cumsum().astype(np.float64)
+    trades['Account Accumulated Quantity'] = trades.groupby(['Account', 'Ticker', 'Display Suffix'], sort=False, observed=True)['Quantity'].cumsum().astype(np.float64, copy=False)
     return trades
 
+# Masks are combined in place on numpy arrays so each condition allocates only its own comparison
 def per_account_transfers_with_missing_transactions(trades):
-    return trades[(trades['Action'] == 'Transfer') & (trades['Type'] == 'Out') & (trades['Quantity'] < 0) & (trades['Account Accumulated Quantity'] < 0)]
+    mask = (trades['Action'] == 'Transfer').to_numpy()
+    mask &= (trades['Type'] == 'Out').to_numpy()
+    mask &= trades['Quantity'].to_numpy() < 0
+    mask &= trades['Account Accumulated Quantity'].to_numpy() < 0
+    return trades[mask]
 
 def positions_with_missing_transactions(trades):
-    return trades[((trades['Accumulated Quantity'] < 0) & (trades['Type'] == 'Long') & (trades['Action'] == 'Close') | 
-                  (trades['Accumulated Quantity'] > 0) & (trades['Type'] == 'Short') & (trades['Action'] == 'Close'))]
+    accumulated = trades['Accumulated Quantity'].to_numpy()
+    # Both cases close a position, so the action is compared only once
+    mask = (accumulated < 0) & (trades['Type'] == 'Long').to_numpy()
+    mask |= (accumulated > 0) & (trades['Type'] == 'Short').to_numpy()
+    mask &= (trades['Action'] == 'Close').to_numpy()
+    return trades[mask]
     
 def transfers_with_missing_transactions(trades):
     transfers = trades[(trades['Action'] == 'Transfer') & (trades['Type'] != 'Spinoff')] 
@@ -97,14 +118,14 @@ def transfers_with_missing_transactions(trades):
     if 'Target' in trades.columns:
         incoming = transfers[transfers['Type'] == 'In']
         # Compute over outgoing account name
-        incoming_grouped = incoming.groupby(['Display Name', 'Account'])['Quantity'].sum()
-        outgoing_grouped = outgoing.groupby(['Display Name', 'Target'])['Quantity'].sum()
+        incoming_grouped = incoming.groupby(['Display Name', 'Account'], sort=False, observed=True)['Quantity'].sum()
+        outgoing_grouped = outgoing.groupby(['Display Name', 'Target'], sort=False, observed=True)['Quantity'].sum()
         outgoing_grouped.index = outgoing_grouped.index.set_names('Account', level=1)
         unmatched_outgoing = outgoing_grouped.add(incoming_grouped, fill_value=0)
         unmatched_outgoing = unmatched_outgoing[unmatched_outgoing < 0]
         # Do it again to persist incoming account names
-        incoming_grouped = incoming.groupby(['Display Name', 'Target'])['Quantity'].sum()
-        outgoing_grouped = outgoing.groupby(['Display Name', 'Account'])['Quantity'].sum()
+        incoming_grouped = incoming.groupby(['Display Name', 'Target'], sort=False, observed=True)['Quantity'].sum()
+        outgoing_grouped = outgoing.groupby(['Display Name', 'Account'], sort=False, observed=True)['Quantity'].sum()
         outgoing_grouped.index = outgoing_grouped.index.set_names('Target', level=1)
         unmatched_incoming = incoming_grouped.add(outgoing_grouped, fill_value=0)
         unmatched_incoming = unmatched_incoming[unmatched_incoming > 0]
@@ -1,10 +1,13 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 import matchmaker.trade as trade
 import matchmaker.data as data
 from streamlit_pills import pills
 
-def transaction_table_descriptor_czk():
+# Column configs are built once per process, the public descriptors below hand out copies that pages can extend
+@st.cache_resource
+def _transaction_table_descriptor_czk():
    return {
        'column_order' : ('Display Name', 'Date/Time', 'Quantity', 'Currency', 'T. Price', 'Comm/Fee', 'CZK Proceeds', 'CZK Fee', 'CZK Profit', 'Accumulated Quantity', 'Action', 'Type'),
        'column_config' : {
@@ -25,7 +28,8 @@ def transaction_table_descriptor_czk():
                         }
        }
    
-def transaction_table_descriptor_native():
+@st.cache_resource
+def _transaction_table_descriptor_native():
    return {
        'column_order' : ('Display Name', 'Date/Time', 'Quantity', 'Currency', 'T. Price', 'Comm/Fee', 'Realized P/L', 'Accumulated Quantity', 'Action', 'Account'),
        'column_config' : {
@@ -44,6 +48,14 @@ def transaction_table_descriptor_native():
                         }
        }
 
+def transaction_table_descriptor_czk():
+   descriptor = _transaction_table_descriptor_czk()
+   return {'column_order': descriptor['column_order'], 'column_config': dict(descriptor['column_config'])}
+
+def transaction_table_descriptor_native():
+   descriptor = _transaction_table_descriptor_native()
+   return {'column_order': descriptor['column_order'], 'column_config': dict(descriptor['column_config'])}
+
    
 def add_trades_editor(state : data.State, selected_trade, key=None, callback=None, target_accounts=None):
     key = key if key is not None else 'add_trade_form'
@@ -51,7 +63,11 @@ def add_trades_editor(state : data.State, selected_trade, key=None, callback=Non
         st.caption('Zde můžete přidat chybějící nákup k prodeji')
         # Create a dataframe representing the new trade
         def create_dataframe(trades, symbol, date, quantity, price, target):
-            return pd.DataFrame({'Symbol': [symbol], 'Currency': [selected_trade['Currency']], 'Date/Time': [pd.to_datetime(date)], 'Quantity': [quantity], 
+            # The chosen symbol may differ from the pre-filled trade, so its currency is looked up in the symbol table
+            currency = state.symbols['Currency'].get(symbol)
+            if pd.isna(currency):
+                currency = selected_trade['Currency']
+            return pd.DataFrame({'Symbol': [symbol], 'Currency': [currency], 'Date/Time': [pd.to_datetime(date)], 'Quantity': [quantity], 
                         'T. Price': [price], 'C. Price': [price], 'Action': ['Open'], 'Type': ['Long'], 'Account': [selected_trade['Account']],
                         'Proceeds': [-quantity*price], 'Target': [target], 'Comm/Fee': [0], 'Basis': [0], 'Realized P/L': [0], 'MTM P/L': [0]})
         
@@ -75,10 +91,12 @@ def add_trades_editor(state : data.State, selected_trade, key=None, callback=Non
             symbolcol, datecol, quantitycol, pricecol, accountcol, buttoncol, spacer_ = st.columns([1, 1, 1, 1, 1, 1, 1])
 
         with symbolcol:
-            symbols = state.trades['Symbol'].unique()
-            st.selectbox('Symbol', symbols, index=symbols.tolist().index(selected_trade['Symbol']), key=key+'_new_symbol')
+            # Categorical symbols already know their distinct values, no pass over all trades is needed
+            symbols = state.trades['Symbol']
+            symbols = symbols.cat.categories.tolist() if isinstance(symbols.dtype, pd.CategoricalDtype) else symbols.unique().tolist()
+            st.selectbox('Symbol', symbols, index=symbols.index(selected_trade['Symbol']), key=key+'_new_symbol')
         with datecol:
-            st.date_input('Datum nákupu', value=selected_trade['Date/Time'], max_value=state.trades['Date/Time'].max(), key=key+'_new_date')
+            st.date_input('Datum nákupu', value=selected_trade['Date/Time'], max_value=state.latest_trade_time(), key=key+'_new_date')
         with quantitycol:
             st.number_input('Počet kusů', value=abs(selected_trade['Accumulated Quantity']), step=1.0, key=key+'_new_quantity')
         with pricecol:
@@ -92,7 +110,8 @@ def add_trades_editor(state : data.State, selected_trade, key=None, callback=Non
                                                                                                  st.session_state.get(key+'_new_quantity'), st.session_state.get(key+'_new_price'), st.session_state.get(key+'_account'))))
             
 def add_years_filter(trades, show_all=True, title='Vyberte si rok'):
-    years = sorted(trades['Year'].unique())
+    # Years are a small integer column, numpy returns them already sorted
+    years = np.unique(trades['Year'].to_numpy())
     extra = ['All'] if show_all else []
     year_str = pills(title, extra + [str(year) for year in years])
     year = int(year_str) if year_str != 'All' else None
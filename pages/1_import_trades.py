@@ -1,7 +1,9 @@
+import hashlib
 import pandas as pd
 import numpy as np
 import argparse
 import streamlit as st
+from streamlit.runtime.uploaded_file_manager import UploadedFile
 from matchmaker.trade import *
 from matchmaker.ibkr import *
 from matchmaker.pairing import *
@@ -10,47 +12,51 @@ from menu import menu
 import matchmaker.data as data
 import matchmaker.snapshot as snapshot
 
+TRADES_PAGE_SIZE = 200
+
+# Parsing is the dominant cost of every rerun, so identical uploads are served from cache
+@st.cache_data(show_spinner=False, hash_funcs={UploadedFile: lambda f: (f.name, f.size, hashlib.md5(f.getvalue()).hexdigest())})
+def _import_cached(file):
+    if snapshot.is_snapshot(file):
+        return snapshot.load_snapshot(file)
+    else:
+        return import_activity_statement(file)
+
 def import_trade_file(file):
     try:
-        if snapshot.is_snapshot(file):
-            return snapshot.load_snapshot(file)
-        else:
-            return import_activity_statement(file)
+        return _import_cached(file)
     except Exception as e:
         st.error(f'Error importing trades. File {file.name} does not contain the expected format. Error: {e}')
         return pd.DataFrame()
     
 
-def main():
-    st.set_page_config(page_title='Krutopřísný tradematcher', layout='centered')
-    menu()
-    data.load_settings()
-    # st.header('Taxonomy Matchmaker')
-    st.subheader('Import transkací z Interactive Brokers')
-    
-    # Process command-line arguments
-    parser = argparse.ArgumentParser(description='Process command-line arguments')
+# Actions change only on import, other reruns of the fragment take the shown tables from cache
+@st.cache_data(show_spinner=False)
+def corporate_action_views(actions):
+    splits = actions[actions['Action'] == 'Split'].copy()
+    splits['Reverse Ratio'] = np.reciprocal(splits['Ratio'].to_numpy(dtype=np.float64))
+    spinoffs = actions[actions['Action'].isin(('Spinoff', 'Acquisition'))]
+    unparsed = actions[actions['Action'] == 'Unknown']
+    return splits, spinoffs, unparsed
 
-    # Add the arguments
-    parser.add_argument('--settings-dir', type=str, help='Path to CurrencyRates.csv file')
-    parser.add_argument('--import-trades-dir', type=str, help='Path to Trades CSV files')
-    parser.add_argument('--tickers-dir', type=str, help='Path to load historic ticker data to adjust prices for splits')
-    parser.add_argument('--load-trades', type=str, help='Path to load processed trades file')
-    parser.add_argument('--save-trades', type=str, help='Path to save processed trades file after import')
-    parser.add_argument('--process-years', type=str, help='List of years to process, separated by commas. If not specified, all years are processed.')
-    parser.add_argument('--preserve-years', type=str, help='List of years to keep unchanged, separated by commas. If not specified, all years are preserved.')
-    parser.add_argument('--strategy', type=str, default='fifo', help='Strategy to use for pairing buy and sell orders. Available: fifo, lifo, average-cost, max-loss. max-profit')
-    parser.add_argument('--save-trade-overview-dir', type=str, help='Directory to output overviews of matched trades')
-    parser.add_argument('--load-matched-trades', type=str, help='Paired trades input to load')
-    parser.add_argument('--save-matched-trades', type=str, help='Save updated paired trades')
-    
-    # Parse the arguments
-    args = parser.parse_args()
+# Clicking the download button reruns only the button instead of the import and the trades table
+@st.fragment
+def download_fragment():
+    state = data.State()
+    state.load_session()
+    if (len(state.trades) > 0):
+        trades_csv = snapshot.save_snapshot(state.trades, state.actions, state.positions)
+        st.download_button('📩 Stáhnout vše v CSV', trades_csv, 'merged_trades.csv', 'text/csv', use_container_width=True, help='Stažením dostanete celý stav výpočtu pro další použití. Stačí příště přetáhnout do importu pro pokračování.')
 
+# Widgets of the upload and the tables they feed rerun on their own, without the rest of the page
+@st.fragment
+def import_fragment():
     state = data.State()
     state.load_session()
 
     def change_uploaded_files(previous_uploads):
+        # The uploads get imported again into the reset state
+        st.session_state.pop('import_fingerprint', None)
         if len(previous_uploads) > 0:
             state.reset()
         
@@ -80,33 +86,42 @@ def main():
     import_state = st.caption('')
     trades_count = len(state.trades)
     loaded_count = 0
-    # On upload, run import trades
-    if uploaded_files:
+    # On upload, run import trades. Other reruns of the fragment would only merge the same files again
+    fingerprint = tuple((f.file_id, f.size) for f in uploaded_files)
+    if uploaded_files and st.session_state.get('import_fingerprint') != fingerprint:
+        # Parse every file first and concatenate only once at the end, instead of growing the tables per file
+        new_trades, new_actions, new_positions = [], [], []
         for uploaded_file in uploaded_files:
             import_state.write('Importuji transakce...')
             imported_trades, imported_actions, imported_positions = import_trade_file(uploaded_file)
+            new_trades.append(imported_trades)
             if len(imported_actions) > 0:
-                state.actions = pd.concat([imported_actions, state.actions])
-            # Merge open positions and drop duplicates
-            state.positions = pd.concat([imported_positions, state.positions])
-            state.positions.drop_duplicates(subset=['Symbol', 'Date'], inplace=True)
+                new_actions.append(imported_actions)
+            new_positions.append(imported_positions)
             loaded_count += len(imported_trades)
-            import_state.write(f'Slučuji :blue[{len(imported_trades)}] obchodů...')
-            state.trades = merge_trades(state.trades, imported_trades)
-            import_message = f'Importováno :green[{len(state.trades) - trades_count}] obchodů.'
-            import_state.write(import_message)
 
+        # Later files take precedence, so they go first before deduplication
+        state.actions = pd.concat(new_actions[::-1] + [state.actions], copy=False, sort=False)
+        # Merge open positions and drop duplicates
+        state.positions = pd.concat(new_positions[::-1] + [state.positions], copy=False, sort=False)
+        state.positions.drop_duplicates(subset=['Symbol', 'Date'], inplace=True)
+        import_state.write(f'Slučuji :blue[{loaded_count}] obchodů...')
+        state.trades = merge_trades(state.trades, pd.concat(new_trades, copy=False, sort=False))
         import_state.write(f'Nalezeno :blue[{loaded_count}] obchodů, z nichž :green[{len(state.trades) - trades_count}] je nových.')
-        state.actions.drop_duplicates(inplace=True)
+        # The description names the symbol and the action, so it identifies a row together with its time and quantity
+        state.actions.drop_duplicates(subset=['Date/Time', 'Description', 'Quantity'], inplace=True)
         state.recompute_positions()
         state.save_session()
+        st.session_state['import_fingerprint'] = fingerprint
 
     if (len(state.trades) == 0):
         return
     
-    state.trades.sort_values(by=['Symbol', 'Date/Time'], inplace=True)
     st.caption(f':blue[{len(state.trades)}] nalezených obchodů.')
-    st.dataframe(data=state.trades, hide_index=True, width=1100, height=500, column_order=('Ticker', 'Date/Time', 'Action', 'Quantity', 'Currency', 'T. Price', 'Proceeds', 'Comm/Fee', 'Realized P/L', 'Accumulated Quantity', 'Split Ratio'),
+    # Send only one page of trades to the browser instead of the whole table
+    page_count = (len(state.trades) - 1) // TRADES_PAGE_SIZE + 1
+    page = st.number_input('Stránka', min_value=1, max_value=page_count, value=1, help=f'Obchody se zobrazují po {TRADES_PAGE_SIZE}') if page_count > 1 else 1
+    st.dataframe(data=state.trades.iloc[(page - 1) * TRADES_PAGE_SIZE:page * TRADES_PAGE_SIZE], hide_index=True, width=1100, height=500, column_order=('Ticker', 'Date/Time', 'Action', 'Quantity', 'Currency', 'T. Price', 'Proceeds', 'Comm/Fee', 'Realized P/L', 'Accumulated Quantity', 'Split Ratio'),
                     column_config={
                         'Ticker': st.column_config.TextColumn("Název", help="Název instrumentu"),
                         'Date/Time': st.column_config.DatetimeColumn("Datum", help="Čas obchodu"),
@@ -122,8 +137,7 @@ def main():
 
     # Show imported splits
     if len(state.actions) > 0:
-        splits = state.actions[state.actions['Action'] == 'Split'].copy()
-        splits['Reverse Ratio'] = 1 / splits['Ratio']
+        splits, spinoffs, unparsed = corporate_action_views(state.actions)
         if len(splits) > 0:
             with st.expander(f'Splity, kterým rozumíme (:blue[{len(splits)}])'):
                 st.dataframe(data=splits, hide_index=True, 
@@ -131,7 +145,6 @@ def main():
                             column_config={
                                 "Date/Time": st.column_config.DatetimeColumn("Datum", help="Čas splitu"),
                                 'Reverse Ratio': st.column_config.NumberColumn("Poměr", help="Počet akcií, na které byla jedna akcie rozdělena", format="%f")})
-        spinoffs = state.actions[(state.actions['Action'] == 'Spinoff') | (state.actions['Action'] == 'Acquisition')].copy()
         if len(spinoffs) > 0:
             with st.expander(f'Vytvoření nových akcií (spinoffy), kterým rozumíme (:blue[{len(spinoffs)}])'):
                 st.dataframe(data=spinoffs, hide_index=True, 
@@ -142,7 +155,6 @@ def main():
                                 'Ratio': st.column_config.NumberColumn("Poměr", help="Poměr nových akcií za staré", format="%.3f"),
                                 'Description': st.column_config.NumberColumn("Popis", help="Textový popis spinoffu")})
         
-        unparsed = state.actions[state.actions['Action'] == 'Unknown']
         if len(unparsed) > 0:
             with st.expander(f'Korporátní akce, které neznáme (:blue[{len(unparsed)}])'):
                 st.dataframe(data=unparsed, hide_index=True, 
@@ -154,16 +166,47 @@ def main():
     col1, spacer, col2 = st.columns([0.3, 0.3, 0.2])
     # Serve merged trades as CSV    
     with col1:
-        if (len(state.trades) > 0):
-            trades_csv = snapshot.save_snapshot(state.trades, state.actions, state.positions).encode('utf-8')
-            st.download_button('📩 Stáhnout vše v CSV', trades_csv, 'merged_trades.csv', 'text/csv', use_container_width=True, help='Stažením dostanete celý stav výpočtu pro další použití. Stačí příště přetáhnout do importu pro pokračování.')
+        download_fragment()
     # Clear uploaded files
     with col2:
         def clear_uploads():
             st.session_state.pop('file_uploader', None)
+            st.session_state.pop('import_fingerprint', None)
             state.reset()
             state.save_session()
         st.button('🧹 Smazat obchody', on_click=lambda: clear_uploads(), use_container_width=True)
+
+# Command-line arguments do not change for the lifetime of the process, so they are parsed once
+@st.cache_resource
+def parse_arguments():
+    # Process command-line arguments
+    parser = argparse.ArgumentParser(description='Process command-line arguments')
+
+    # Add the arguments
+    parser.add_argument('--settings-dir', type=str, help='Path to CurrencyRates.csv file')
+    parser.add_argument('--import-trades-dir', type=str, help='Path to Trades CSV files')
+    parser.add_argument('--tickers-dir', type=str, help='Path to load historic ticker data to adjust prices for splits')
+    parser.add_argument('--load-trades', type=str, help='Path to load processed trades file')
+    parser.add_argument('--save-trades', type=str, help='Path to save processed trades file after import')
+    parser.add_argument('--process-years', type=str, help='List of years to process, separated by commas. If not specified, all years are processed.')
+    parser.add_argument('--preserve-years', type=str, help='List of years to keep unchanged, separated by commas. If not specified, all years are preserved.')
+    parser.add_argument('--strategy', type=str, default='fifo', help='Strategy to use for pairing buy and sell orders. Available: fifo, lifo, average-cost, max-loss. max-profit')
+    parser.add_argument('--save-trade-overview-dir', type=str, help='Directory to output overviews of matched trades')
+    parser.add_argument('--load-matched-trades', type=str, help='Paired trades input to load')
+    parser.add_argument('--save-matched-trades', type=str, help='Save updated paired trades')
+    
+    return parser.parse_args()
+
+def main():
+    st.set_page_config(page_title='Krutopřísný tradematcher', layout='centered')
+    menu()
+    data.load_settings()
+    # st.header('Taxonomy Matchmaker')
+    st.subheader('Import transkací z Interactive Brokers')
+    
+    args = parse_arguments()
+
+    import_fragment()
     
     return
 
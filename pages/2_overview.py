@@ -15,24 +15,20 @@ data.load_settings()
 state = data.State()
 state.load_session()
 
-if state.trades.empty:
-    st.caption('Nebyly importovány žádné obchody.')
-    st.page_link("pages/1_import_trades.py", label="📥 Přejít na import obchodů")
-else:
-    st.caption(str(len(state.trades)) + ' transakcí k dispozici.')
-
-
-if state.trades is not None and not state.trades.empty:    
-    daily_rates = currency.load_daily_rates(st.session_state['settings']['currency_rates_dir'])
-    yearly_rates = currency.load_yearly_rates(st.session_state['settings']['currency_rates_dir'])
-    trades = currency.add_czk_conversion_to_trades(state.trades, daily_rates, use_yearly_rates=False)
+# Picking a year reruns only this view, the rates and the CZK conversion are not repeated
+@st.fragment
+def year_view(state, converted_trades, trades):
+    # A trade added from the view replaces the session trades, the whole page then converts them again
+    if st.session_state.get('trades') is not converted_trades:
+        st.rerun()
     year=ux.add_years_filter(trades)
     st.session_state.update(year=year)
     st.caption(f'Vysvětlivky k jednotlivým sloupcům jsou k dispozici na najetí myší.')
-    shown_trades = trades[trades['Year'] == year] if year is not None else trades
+    shown_trades = trades.iloc[state.rows_by_year().get(year, [])] if year is not None else trades
+    # Shared by all tables below that show the columns unchanged
     table_descriptor = ux.transaction_table_descriptor_czk()
     trades_display = st.dataframe(shown_trades, hide_index=True, column_order=table_descriptor['column_order'], column_config=table_descriptor['column_config'])
-    profit_czk = trades[trades['Year'] == year]['CZK Profit'].sum() if year is not None else trades['CZK Profit'].sum()
+    profit_czk = shown_trades['CZK Profit'].sum()
     if year is not None:
         st.caption(f'Profit tento rok dle brokera: :green[{profit_czk:.0f}] CZK') 
     else: 
@@ -42,7 +38,6 @@ if state.trades is not None and not state.trades.empty:
     if len(missing_history) > 0:
         with st.container(border=False):
             st.error('Historie obsahuje převody pozic mezi účty, kterým chybí nákupní transakce. Pro efektivní párování je třeba doplnit chybějící obchody, aby nákupní cena a datum mohly být použity pro daňové optimalizace.')
-            table_descriptor = ux.transaction_table_descriptor_czk()
             st.dataframe(missing_history, hide_index=True, column_config=table_descriptor['column_config'], column_order=table_descriptor['column_order'])
             ux.add_trades_editor(state, missing_history.iloc[0], 'missing_transfers')   
     else:
@@ -50,7 +45,6 @@ if state.trades is not None and not state.trades.empty:
         if len(suspicious_positions) > 0:
             with st.container(border=False):
                 st.error('Historie obsahuje transakce, kterým nesedí výsledné pozice. Je možné, že nebyly nahrány všechny obchody či korporátní akce. Zkontrolujte, prosím, zdrojová data a případně doplňte chybějící transakce.')
-                table_descriptor = ux.transaction_table_descriptor_czk()
                 st.dataframe(suspicious_positions, hide_index=True, column_config=table_descriptor['column_config'], column_order=table_descriptor['column_order'])
                 ux.add_trades_editor(state, suspicious_positions.iloc[0], 'suspicious_positions')
 
@@ -62,7 +56,21 @@ if state.trades is not None and not state.trades.empty:
             table_descriptor['column_config']['Target'] = st.column_config.TextColumn("Účet", help="Název účtu, odkud byly převedeny instrumenty.")
             table_descriptor['column_order'] = ('Target',) + table_descriptor['column_order']
             st.dataframe(missing_incoming_history, hide_index=True, column_config=table_descriptor['column_config'], column_order=table_descriptor['column_order'])
+            # The first unmatched transfer is keyed by its name and source account, no row has to be built for them
+            display_name, target = missing_incoming_history.index[0]
             missing_incoming_history = missing_incoming_history.reset_index()
-            matching_trade = trades[(trades['Display Name'] == missing_incoming_history.iloc[0]['Display Name']) & 
-                                     (trades['Target'] == missing_incoming_history.iloc[0]['Target'])]
-            ux.add_trades_editor(state, matching_trade.iloc[0], 'incoming_history', None, missing_incoming_history['Target'])
\ No newline at end of file
+            matching_trade = trades[(trades['Display Name'] == display_name) & (trades['Target'] == target)]
+            ux.add_trades_editor(state, matching_trade.iloc[0], 'incoming_history', None, missing_incoming_history['Target'])
+
+if state.trades.empty:
+    st.caption('Nebyly importovány žádné obchody.')
+    st.page_link("pages/1_import_trades.py", label="📥 Přejít na import obchodů")
+else:
+    st.caption(str(len(state.trades)) + ' transakcí k dispozici.')
+
+
+if state.trades is not None and not state.trades.empty:    
+    daily_rates = currency.load_daily_rates(st.session_state['settings']['currency_rates_dir'])
+    yearly_rates = currency.load_yearly_rates(st.session_state['settings']['currency_rates_dir'])
+    trades = state.trades_in_czk(daily_rates)
+    year_view(state, state.trades, trades)
@@ -39,10 +39,10 @@ if state.trades is not None and not state.trades.empty:
         table_descriptor = ux.transaction_table_descriptor_native()
         trades_display = st.dataframe(shown_trades, hide_index=True, column_order=table_descriptor['column_order'], column_config=table_descriptor['column_config'])
         profit = shown_trades['Realized P/L'].sum()
-        held_position = shown_trades['Accumulated Quantity'].iloc[-1]
+        held_position = shown_trades['Accumulated Quantity'].iat[-1]
         if held_position != 0:
             st.markdown(f'**Držené pozice: :blue[{held_position:.0f}]**')
-        st.caption(f'Realizovaný profit dle brokera: :green[{profit:.0f}] {shown_trades["Currency"].iloc[0]}')
+        st.caption(f'Realizovaný profit dle brokera: :green[{profit:.0f}] {shown_trades["Currency"].iat[0]}')
             
         suspicious_positions = shown_trades[((shown_trades['Accumulated Quantity'] < 0) & (shown_trades['Type'] == 'Long') & (shown_trades['Action'] == 'Close') | 
                                             (shown_trades['Accumulated Quantity'] > 0) & (shown_trades['Type'] == 'Short') & (shown_trades['Action'] == 'Close'))]
@@ -0,0 +1,34 @@
+import pandas as pd
+import matchmaker.data as data
+import matchmaker.trade as trade
+
+def make_trades(rows):
+    return trade.normalize_trades(pd.DataFrame([{'Symbol': symbol, 'Currency': 'USD', 'Date/Time': pd.Timestamp(time), 'Quantity': quantity,
+                                                 'T. Price': 10.0, 'C. Price': 10.0, 'Action': 'Open', 'Type': 'Long', 'Account': 'U1234567',
+                                                 'Proceeds': -10.0 * quantity, 'Target': None, 'Comm/Fee': 0.0, 'Basis': 0.0, 'Realized P/L': 0.0,
+                                                 'MTM P/L': 0.0} for symbol, time, quantity in rows]))
+
+def accumulated(state, symbol):
+    trades = state.trades[state.trades['Symbol'] == symbol].sort_values(by='Date/Time')
+    return trades['Ticker'].astype(object).tolist(), trades['Accumulated Quantity'].tolist()
+
+# Renames are guessed from the positions of all tickers, a manual trade that explains a mismatch has to drop the guess
+def test_manual_trade_drops_invalidated_rename():
+    state = data.State()
+    positions = pd.DataFrame({'Symbol': ['BBB'], 'Date': [pd.Timestamp('2023-12-31')], 'Quantity': [15.0], 'Account': ['U1234567']})
+    state.update(trades=make_trades([('AAA', '2023-01-05', 10.0), ('BBB', '2023-06-05', 5.0)]), actions=pd.DataFrame(), positions=positions)
+    state.recompute_positions()
+    # AAA is missing from the snapshot and BBB lacks the same quantity, so AAA looks renamed to BBB
+    assert state.symbols.loc['AAA', 'Ticker'] == 'BBB'
+
+    state.add_manual_trades(make_trades([('BBB', '2023-02-05', 10.0)]))
+    assert state.symbols.loc['AAA', 'Ticker'] == 'AAA'
+    assert accumulated(state, 'AAA') == (['AAA'], [10.0])
+    assert accumulated(state, 'BBB') == (['BBB', 'BBB'], [10.0, 15.0])
+
+# Frames with the same values but other columns or dtypes must not share cached positions
+def test_cache_key_includes_columns_and_dtypes():
+    frame = pd.DataFrame({'Quantity': [1, 2]})
+    assert data._hash_dataframe(frame) == data._hash_dataframe(frame.copy())
+    assert data._hash_dataframe(frame) != data._hash_dataframe(frame.rename(columns={'Quantity': 'Price'}))
+    assert data._hash_dataframe(frame) != data._hash_dataframe(frame.astype('int32'))
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+from matchmaker import hash
+
+def assert_same_hashes(df):
+    assert hash.hash_rows(df) == list(df.apply(hash.hash_row, axis=1))
+
+# Row hashes are persisted in snapshots, the column-wise formatting has to print every value like Series.to_string()
+def test_hash_rows_matches_hash_row_with_missing_values():
+    assert_same_hashes(pd.DataFrame({
+        'Symbol': ['AAPL', None, 'MSFT', 'X' * 120],
+        'Price': [1.5, np.nan, 0.1, 1e-7],
+        'Date/Time': pd.to_datetime(['2023-01-05 10:00:00', None, '2024-02-01 00:00:00', '2022-12-31 23:59:59']),
+        'Count': pd.array([1, pd.NA, 3, 4], dtype='Int64'),
+        'Account': pd.array(['U1234567', pd.NA, 'U7654321', 'U1'], dtype='string'),
+        'Note': ['a\tb', pd.NA, 'line\nbreak', ''],
+    }))
+
+def test_hash_rows_matches_hash_row_with_nullable_columns_only():
+    assert_same_hashes(pd.DataFrame({
+        'Count': pd.array([1, pd.NA], dtype='Int64'),
+        'Account': pd.array(['U1234567', pd.NA], dtype='string'),
+    }))
@@ -0,0 +1,13 @@
+from io import BytesIO
+import pandas as pd
+import matchmaker.snapshot as snapshot
+
+# Transfers from accounts with only numeric names leave floats among the account names in Target
+def test_snapshot_with_mixed_target_column():
+    trades = pd.DataFrame({'Symbol': ['AAPL', 'AAPL', 'MSFT'], 'Target': ['U1234567', 12345.0, None]},
+                          index=pd.Index(['a', 'b', 'c'], name='Hash'))
+    saved = snapshot.save_snapshot(trades, pd.DataFrame(), pd.DataFrame())
+    assert snapshot.is_snapshot(BytesIO(saved))
+    assert b'"U1234567"' in saved and b'"12345.0"' in saved
+    # The session tables are left untouched
+    assert trades['Target'].iloc[1] == 12345.0